@@ -1,7 +1,5 @@
-import os
 import irc.client
 import irc.connection
-import httpx
 import time
 import threading
 import random
@@ -9,41 +7,74 @@ import datetime
 import re
 import json
 import argparse
+import signal
 from pathlib import Path
+from dataclasses import dataclass
 from difflib import SequenceMatcher
 from dotenv import load_dotenv
 import hashlib
+from ollama_pool import OllamaPool
+from chat_memory import ChatMemory
+from prompt_builder import TokenCounter, build_prompt
+from roster import Roster, history_speaker
+from settings import Settings, load_settings
+from limiter import ResizableSemaphore
+from profiling import Profiler
+from revival import RevivalScheduler
 
 # Load environment variables
 load_dotenv()
 
 # Global state for config and prompt reloading
+CONFIG_FILE = "config.json"
 config_hash = None
 prompt_hash = None
-config = None
 prompts = None
 last_config_check = 0
 last_prompt_check = 0
 CONFIG_CHECK_INTERVAL = 5  # Check for changes every 5 seconds
+PROMPT_RESERVE_TOKENS = 32  # Slack left in the context window for token estimate error
+OLLAMA_TIMEOUT = 350  # Seconds to wait for one Ollama generation
+REVIVAL_MAX_ATTEMPTS = 1  # Backends a revival tries; bounds how long it can take
 
-# Global variables for bot configuration
-SERVER = None
-PORT = None
-CHANNEL = None
-BOT_NAME = None
-PERSONALITY = None
-MODEL = None
-ALWAYS_RESPOND_TO = None
-OLLAMA_URL = None
-ENABLE_LOGGING = None
-LOG_DIR = None
-PROMPT_FILE = None
-OFF_TOPIC_CHANCE = None
-TONE_CHANCE = None
-POST_DELAY_SECONDS = None
-POST_DELAY_JITTER = None
-MAX_CONCURRENT_REQUESTS = None
-CONVERSATION_HISTORY_LENGTH = None
+@dataclass(frozen=True)
+class Runtime:
+    """A configuration snapshot together with the components built for it"""
+
+    settings: Settings
+    token_counter: TokenCounter
+    chat_memory: ChatMemory
+
+# Current Runtime. Never mutated, only replaced by apply_settings; code that
+# needs several settings, or the counter or memory that go with them, should
+# read it once and keep the reference.
+runtime = None
+
+# Pool of Ollama backends, created once the initial config has been loaded
+ollama_pool = None
+
+# Channel members and the compiled mention matcher built from them
+roster = None
+
+# Decides when this bot revives a quiet channel; created in main() once the reactor exists
+revival_scheduler = None
+
+# Limits concurrent Ollama requests; resized on reload without dropping in-flight requests
+request_limiter = None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='IRC Chatbot with Ollama integration')
+    parser.add_argument('--bot-name', type=str, help='Name of the bot (overrides config and env)')
+    parser.add_argument('--personality', type=str, help='Bot personality (overrides config and env)')
+    parser.add_argument('--model', type=str, help='Ollama model to use (overrides config and env)')
+    parser.add_argument('--irc-server', type=str, help='IRC server address (overrides config and env)')
+    parser.add_argument('--irc-port', type=int, help='IRC server port (overrides config and env)')
+    parser.add_argument('--irc-channel', type=str, help='IRC channel to join (overrides config and env)')
+    parser.add_argument('--ollama-url', type=str, help='Ollama API URL, or comma-separated list of URLs (overrides config and env)')
+    return parser.parse_args()
+
+# Command line arguments are parsed once; reloads reuse them
+ARGS = parse_args()
 
 def get_file_hash(filepath):
     """Get MD5 hash of a file's contents"""
@@ -54,83 +85,98 @@ def get_file_hash(filepath):
         print(f"Error reading file {filepath}: {e}")
         return None
 
+def make_token_counter(cfg):
+    """Token counter for cfg's model, exact if cfg asks for it"""
+    if not cfg.exact_token_count:
+        return TokenCounter()
+
+    def count_exact(lines):
+        # Tokenizer calls load the backend like generations do, so they share the limit
+        with request_limiter:
+            return ollama_pool.count_tokens(cfg.model, lines, num_ctx=cfg.num_ctx)
+
+    return TokenCounter(exact_fn=count_exact)
+
+def make_chat_memory(cfg):
+    """Memory index over the log that log_message writes for cfg"""
+    log_dir = Path(cfg.log_dir)
+    return ChatMemory(
+        log_dir / f"{cfg.bot_name}.log",
+        log_dir / f"{cfg.bot_name}.index.jsonl",
+        name=cfg.bot_name
+    )
+
+def apply_settings(new_settings):
+    """Reconfigure long-lived components for new_settings, then publish it.
+
+    new_settings comes from load_settings, which has already validated it, so
+    nothing here is expected to fail partway through. The settings, token
+    counter and memory are published together as one Runtime.
+    """
+    global runtime
+
+    old = runtime
+    old_settings = old.settings if old is not None else None
+    ollama_pool.set_backends(new_settings.ollama_urls)
+    ollama_pool.health_check_interval = new_settings.health_check_interval
+    request_limiter.set_limit(new_settings.max_concurrent_requests)
+    roster.bot_pattern = new_settings.bot_nick_pattern
+    if revival_scheduler is not None:
+        configure_revival(revival_scheduler, new_settings)
+    if (old_settings is None
+            or old_settings.model != new_settings.model
+            or old_settings.num_ctx != new_settings.num_ctx
+            or old_settings.exact_token_count != new_settings.exact_token_count):
+        token_counter = make_token_counter(new_settings)
+    else:
+        token_counter = old.token_counter
+    if (old_settings is None
+            or old_settings.log_dir != new_settings.log_dir
+            or old_settings.bot_name != new_settings.bot_name):
+        chat_memory = make_chat_memory(new_settings)
+    else:
+        chat_memory = old.chat_memory
+
+    runtime = Runtime(new_settings, token_counter, chat_memory)
+    if old is not None and old.chat_memory is not chat_memory:
+        # Replies still holding the old Runtime can keep querying it; closing
+        # only stops its writer, and the new memory catches up from the log
+        old.chat_memory.close()
+
+def configure_revival(scheduler, cfg):
+    scheduler.idle_seconds = cfg.revival_idle_seconds
+    scheduler.jitter_seconds = cfg.revival_jitter_seconds
+    scheduler.backup_seconds = cfg.revival_backup_seconds
+    # Runners-up must not give up on the elected bot while it is still generating
+    scheduler.generation_seconds = OLLAMA_TIMEOUT * REVIVAL_MAX_ATTEMPTS
+
 def reload_config():
-    """Reload configuration from config.json"""
-    global config, config_hash
-    global SERVER, PORT, CHANNEL, BOT_NAME, PERSONALITY, MODEL, ALWAYS_RESPOND_TO
-    global OLLAMA_URL, ENABLE_LOGGING, LOG_DIR, PROMPT_FILE
-    global OFF_TOPIC_CHANCE, TONE_CHANCE, POST_DELAY_SECONDS, POST_DELAY_JITTER
-    global MAX_CONCURRENT_REQUESTS, CONVERSATION_HISTORY_LENGTH
-    
+    """Reload configuration from config.json and swap in the new snapshot"""
+    global config_hash
+
+    # Hash before reading, so a write that lands mid-reload is picked up next check
+    new_hash = get_file_hash(CONFIG_FILE)
     try:
-        with open("config.json", "r", encoding="utf-8") as f:
-            new_config = json.load(f)
-            
-        # Override with environment variables if they exist
-        new_config["irc"]["server"] = os.getenv("IRC_SERVER", new_config["irc"]["server"])
-        new_config["irc"]["port"] = int(os.getenv("IRC_PORT", new_config["irc"]["port"]))
-        new_config["irc"]["channel"] = os.getenv("IRC_CHANNEL", new_config["irc"]["channel"])
-        
-        new_config["bot"]["name"] = os.getenv("BOT_NAME", new_config["bot"]["name"])
-        new_config["bot"]["personality"] = os.getenv("BOT_PERSONALITY", new_config["bot"]["personality"])
-        new_config["bot"]["model"] = os.getenv("BOT_MODEL", new_config["bot"]["model"])
-        new_config["bot"]["always_respond_to"] = os.getenv("BOT_ALWAYS_RESPOND_TO", new_config["bot"]["always_respond_to"])
-        
-        new_config["ollama"]["url"] = os.getenv("OLLAMA_URL", new_config["ollama"]["url"])
-        
-        # Override with command line arguments if they exist
-        args = parse_args()
-        if args.bot_name:
-            new_config["bot"]["name"] = args.bot_name
-        if args.personality:
-            new_config["bot"]["personality"] = args.personality
-        if args.model:
-            new_config["bot"]["model"] = args.model
-        if args.irc_server:
-            new_config["irc"]["server"] = args.irc_server
-        if args.irc_port:
-            new_config["irc"]["port"] = args.irc_port
-        if args.irc_channel:
-            new_config["irc"]["channel"] = args.irc_channel
-        if args.ollama_url:
-            new_config["ollama"]["url"] = args.ollama_url
-
-        config = new_config
-        config_hash = get_file_hash("config.json")
-        print(f"[{new_config['bot']['name']}] Configuration reloaded successfully")
-        
-        # Update global variables
-        SERVER = config["irc"]["server"]
-        PORT = config["irc"]["port"]
-        CHANNEL = config["irc"]["channel"][0]
-        BOT_NAME = config["bot"]["name"]
-        PERSONALITY = config["bot"]["personality"]
-        MODEL = config["bot"]["model"]
-        ALWAYS_RESPOND_TO = config["bot"]["always_respond_to"]
-        OLLAMA_URL = config["ollama"]["url"]
-        ENABLE_LOGGING = config["logging"]["enabled"]
-        LOG_DIR = config["logging"]["log_dir"]
-        PROMPT_FILE = config["files"]["prompt_file"]
-        OFF_TOPIC_CHANCE = config["behavior"]["off_topic_chance"]
-        TONE_CHANCE = config["behavior"]["tone_chance"]
-        POST_DELAY_SECONDS = config["behavior"]["post_delay_seconds"]
-        POST_DELAY_JITTER = config["behavior"]["post_delay_jitter"]
-        MAX_CONCURRENT_REQUESTS = config["behavior"]["max_concurrent_requests"]
-        CONVERSATION_HISTORY_LENGTH = config["behavior"]["conversation_history_length"]
-        
+        new_settings = load_settings(CONFIG_FILE, ARGS)
+        apply_settings(new_settings)
     except Exception as e:
-        print(f"Error reloading config: {e}")
+        print(f"Error reloading config, keeping the current one: {e}")
+        return
+
+    config_hash = new_hash
+    print(f"[{new_settings.bot_name}] Configuration reloaded successfully")
 
 def reload_prompts():
     """Reload prompts from prompts.json"""
     global prompts, prompt_hash
+    cfg = runtime.settings
     try:
-        with open(PROMPT_FILE, "r", encoding="utf-8") as f:
+        with open(cfg.prompt_file, "r", encoding="utf-8") as f:
             prompts = json.load(f)
-        prompt_hash = get_file_hash(PROMPT_FILE)
-        print(f"[{BOT_NAME}] Prompts reloaded successfully")
+        prompt_hash = get_file_hash(cfg.prompt_file)
+        print(f"[{cfg.bot_name}] Prompts reloaded successfully")
     except Exception as e:
-        print(f"[{BOT_NAME}] Error reloading prompts: {e}")
+        print(f"[{cfg.bot_name}] Error reloading prompts: {e}")
 
 def check_for_updates():
     """Check if config or prompts have changed and reload if necessary"""
@@ -140,126 +186,105 @@ def check_for_updates():
     
     # Check config.json
     if current_time - last_config_check >= CONFIG_CHECK_INTERVAL:
-        new_hash = get_file_hash("config.json")
+        new_hash = get_file_hash(CONFIG_FILE)
         if new_hash and new_hash != config_hash:
             reload_config()
         last_config_check = current_time
     
     # Check prompts.json
     if current_time - last_prompt_check >= CONFIG_CHECK_INTERVAL:
-        new_hash = get_file_hash(PROMPT_FILE)
+        new_hash = get_file_hash(runtime.settings.prompt_file)
         if new_hash and new_hash != prompt_hash:
             reload_prompts()
         last_prompt_check = current_time
 
-# Initial load of config and prompts
-reload_config()
-reload_prompts()
-
-def parse_args():
-    parser = argparse.ArgumentParser(description='IRC Chatbot with Ollama integration')
-    parser.add_argument('--bot-name', type=str, help='Name of the bot (overrides config and env)')
-    parser.add_argument('--personality', type=str, help='Bot personality (overrides config and env)')
-    parser.add_argument('--model', type=str, help='Ollama model to use (overrides config and env)')
-    parser.add_argument('--irc-server', type=str, help='IRC server address (overrides config and env)')
-    parser.add_argument('--irc-port', type=int, help='IRC server port (overrides config and env)')
-    parser.add_argument('--irc-channel', type=str, help='IRC channel to join (overrides config and env)')
-    parser.add_argument('--ollama-url', type=str, help='Ollama API URL (overrides config and env)')
-    return parser.parse_args()
-
 # Load configuration
-def load_config():
-    try:
-        with open("config.json", "r", encoding="utf-8") as f:
-            config = json.load(f)
-            
-        # Override with environment variables if they exist
-        config["irc"]["server"] = os.getenv("IRC_SERVER", config["irc"]["server"])
-        config["irc"]["port"] = int(os.getenv("IRC_PORT", config["irc"]["port"]))
-        config["irc"]["channel"] = os.getenv("IRC_CHANNEL", config["irc"]["channel"])
-        
-        config["bot"]["name"] = os.getenv("BOT_NAME", config["bot"]["name"])
-        config["bot"]["personality"] = os.getenv("BOT_PERSONALITY", config["bot"]["personality"])
-        config["bot"]["model"] = os.getenv("BOT_MODEL", config["bot"]["model"])
-        config["bot"]["always_respond_to"] = os.getenv("BOT_ALWAYS_RESPOND_TO", config["bot"]["always_respond_to"])
-        
-        config["ollama"]["url"] = os.getenv("OLLAMA_URL", config["ollama"]["url"])
-        
-        # Override with command line arguments if they exist
-        args = parse_args()
-        if args.bot_name:
-            config["bot"]["name"] = args.bot_name
-        if args.personality:
-            config["bot"]["personality"] = args.personality
-        if args.model:
-            config["bot"]["model"] = args.model
-        if args.irc_server:
-            config["irc"]["server"] = args.irc_server
-        if args.irc_port:
-            config["irc"]["port"] = args.irc_port
-        if args.irc_channel:
-            config["irc"]["channel"] = args.irc_channel
-        if args.ollama_url:
-            config["ollama"]["url"] = args.ollama_url
-        
-        return config
-    except Exception as e:
-        print(f"Error loading config: {e}")
-        raise
-
-# Load configuration
-config = load_config()
-
-# --- Configuration from config file ---
-SERVER = config["irc"]["server"]
-PORT = config["irc"]["port"]
-CHANNEL = config["irc"]["channel"][0]  # Take the first channel from the list
-
-BOT_NAME = config["bot"]["name"]
-PERSONALITY = config["bot"]["personality"]
-MODEL = config["bot"]["model"]
-ALWAYS_RESPOND_TO = config["bot"]["always_respond_to"]
-
-OLLAMA_URL = config["ollama"]["url"]
-ENABLE_LOGGING = config["logging"]["enabled"]
-LOG_DIR = config["logging"]["log_dir"]
-PROMPT_FILE = config["files"]["prompt_file"]
-
-OFF_TOPIC_CHANCE = config["behavior"]["off_topic_chance"]
-TONE_CHANCE = config["behavior"]["tone_chance"]
-POST_DELAY_SECONDS = config["behavior"]["post_delay_seconds"]
-POST_DELAY_JITTER = config["behavior"]["post_delay_jitter"]
-MAX_CONCURRENT_REQUESTS = config["behavior"]["max_concurrent_requests"]
-CONVERSATION_HISTORY_LENGTH = config["behavior"]["conversation_history_length"]
+try:
+    initial_settings = load_settings(CONFIG_FILE, ARGS)
+except Exception as e:
+    print(f"Error loading config: {e}")
+    raise
+config_hash = get_file_hash(CONFIG_FILE)
 
 # --- Shared state for concurrency ---
-request_semaphore = threading.Semaphore(MAX_CONCURRENT_REQUESTS)
+request_limiter = ResizableSemaphore(initial_settings.max_concurrent_requests)
+ollama_pool = OllamaPool(
+    initial_settings.ollama_urls,
+    name=initial_settings.bot_name,
+    health_check_interval=initial_settings.health_check_interval
+)
+roster = Roster(
+    initial_settings.bot_name,
+    bot_pattern=initial_settings.bot_nick_pattern,
+    always_known=[initial_settings.always_respond_to]
+)
+profiler = Profiler(initial_settings.bot_name)
+apply_settings(initial_settings)
+reload_prompts()
 
 # --- Bot state ---
 conversation_history = []
 recent_messages = set()
-last_activity_time = datetime.datetime.now(datetime.UTC)
 last_replies = []
 last_message_time = None
-conversation_revival_thread = None
-conversation_revival_running = False
 
-def log_message(nick, msg):
-    if not ENABLE_LOGGING:
+def log_message(cfg, nick, msg):
+    if not cfg.enable_logging:
         return
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     log_line = f"[{timestamp}] {nick}: {msg}\n"
-    Path(LOG_DIR).mkdir(exist_ok=True)
-    log_path = Path(LOG_DIR) / f"{BOT_NAME}.log"
+    Path(cfg.log_dir).mkdir(exist_ok=True)
+    log_path = Path(cfg.log_dir) / f"{cfg.bot_name}.log"
     with open(log_path, "a", encoding="utf-8") as f:
         f.write(log_line)
 
-def load_prompts():
+def recall_memory(rt, query):
+    """Get past chat lines relevant to query for the prompt's memory slot"""
+    cfg, memory = rt.settings, rt.chat_memory
+    if not cfg.enable_logging or not cfg.memory_enabled or not query:
+        return []
     try:
-        with open(PROMPT_FILE, "r", encoding="utf-8") as f:
+        added = memory.refresh()
+        recalled = memory.recall(
+            query,
+            max_lines=cfg.memory_max_lines,
+            max_chars=cfg.memory_max_chars,
+            exclude=conversation_history
+        )
+    except Exception as e:
+        print(f"[{cfg.bot_name}] Memory lookup failed: {e}")
+        return []
+    print(f"[{cfg.bot_name}] Memory: indexed {added} new lines in {memory.last_update_ms:.1f}ms, "
+          f"query took {memory.last_query_ms:.1f}ms")
+    return recalled.split("\n") if recalled else []
+
+def build_regular_prompt(rt, prompts, query, tone_instruction="", note=""):
+    """Build the regular prompt so that it fits the model's context window"""
+    cfg, counter = rt.settings, rt.token_counter
+    budget = cfg.num_ctx - cfg.num_predict - PROMPT_RESERVE_TOKENS - counter.count(note)
+    system_override = prompts.get("system_instructions", "").strip()
+    if cfg.model.startswith("deepseek") and system_override:
+        budget -= counter.count(system_override)
+
+    prompt, usage = build_prompt(
+        prompts.get("regular_prompt", ""),
+        {"bot_name": cfg.bot_name, "personality": cfg.personality},
+        conversation_history[-cfg.conversation_history_length:],
+        counter,
+        budget,
+        memory=recall_memory(rt, query),
+        tone=tone_instruction,
+        summarize=lambda lines: summarize_history(cfg, lines)
+    )
+    print(f"[{cfg.bot_name}] Prompt budget: {usage.describe()} [{usage.method}, num_ctx={cfg.num_ctx}, num_predict={cfg.num_predict}]")
+    return f"{prompt}{note}"
+
+def load_prompts(cfg):
+    try:
+        with open(cfg.prompt_file, "r", encoding="utf-8") as f:
             return json.load(f)
     except Exception as e:
-        print(f"[{BOT_NAME}] Failed to load prompt config: {e}")
+        print(f"[{cfg.bot_name}] Failed to load prompt config: {e}")
         return {}
 
 def is_repetitive(text):
@@ -279,15 +304,15 @@ def is_looping(text):
             return True
     return False
 
-def clean_reply(reply):
+def clean_reply(cfg, reply):
     # Remove any leading/trailing whitespace
     reply = reply.strip()
     
     # Remove bot name prefix if it exists (case insensitive)
-    reply = re.sub(rf"^{BOT_NAME}[:,]?\s*", "", reply, flags=re.IGNORECASE)
+    reply = re.sub(rf"^{cfg.bot_name}[:,]?\s*", "", reply, flags=re.IGNORECASE)
     
     # Remove any remaining bot name mentions
-    reply = re.sub(rf"{BOT_NAME}[:,]?\s*", "", reply, flags=re.IGNORECASE)
+    reply = re.sub(rf"{cfg.bot_name}[:,]?\s*", "", reply, flags=re.IGNORECASE)
     
     # Remove rule-like text
     rule_patterns = [
@@ -323,46 +348,49 @@ def clean_reply(reply):
     
     return reply
 
-def summarize_history(lines):
+def summarize_history(cfg, lines):
     summary = []
     for line in lines:
-        if line.startswith("Victoria:"):
+        speaker = history_speaker(line)
+        if not speaker:
+            continue
+        if speaker.lower() == cfg.always_respond_to.lower():
             summary.append(line)
-        elif line.startswith("Bot"):
-            match = re.match(r"^(Bot\w+):", line)
-            if match:
-                bot_name = match.group(1)
-                summary.append(f"{bot_name} made a comment.")
+        elif roster.is_bot(speaker):
+            summary.append(f"{speaker} made a comment.")
     return "\n".join(summary)
 
-def generate_reply(prompt, system_override=None, max_retries=3, base_delay=3):
-    print(f"\n[{BOT_NAME}] Sending prompt to Ollama:\n{'='*60}\n{prompt}\n{'='*60}\n")
+def generate_reply(cfg, prompt, system_override=None, max_retries=3, base_delay=3):
+    print(f"\n[{cfg.bot_name}] Sending prompt to Ollama:\n{'='*60}\n{prompt}\n{'='*60}\n")
     
     # First try to generate a response
     try:
-        with request_semaphore:
+        with request_limiter:
             payload = {
-                "model": MODEL,
+                "model": cfg.model,
                 "prompt": prompt,
-                "stream": False
+                "stream": False,
+                "options": {
+                    "num_ctx": cfg.num_ctx,
+                    "num_predict": cfg.num_predict
+                }
             }
-            if MODEL.startswith("deepseek") and system_override:
+            if cfg.model.startswith("deepseek") and system_override:
                 payload["system"] = system_override
 
-            response = httpx.post(OLLAMA_URL, json=payload, timeout=350)
-            response.raise_for_status()
-            reply = response.json().get("response", "").strip()
+            data = ollama_pool.generate(payload, timeout=OLLAMA_TIMEOUT, max_attempts=max_retries)
+            reply = data.get("response", "").strip()
             
             if not reply:
-                print(f"[{BOT_NAME}] Empty reply from Ollama")
+                print(f"[{cfg.bot_name}] Empty reply from Ollama")
                 return get_fallback_response()
             
             # Clean and validate the reply
-            reply = clean_reply(reply)
+            reply = clean_reply(cfg, reply)
             
             # If the reply is looping or repetitive, try to fix it without making another API call
             if is_looping(reply) or is_repetitive(reply):
-                print(f"[{BOT_NAME}] Loop/repeat detected in response. Attempting to fix...")
+                print(f"[{cfg.bot_name}] Loop/repeat detected in response. Attempting to fix...")
                 # Try to extract just the first unique sentence
                 sentences = re.split(r'(?<=[.!?])\s+(?=[A-Z])', reply)
                 if sentences:
@@ -375,11 +403,11 @@ def generate_reply(prompt, system_override=None, max_retries=3, base_delay=3):
                         # If all sentences are too similar, use a fallback
                         return get_fallback_response()
             
-            print(f"[{BOT_NAME}] Ollama reply:\n{'-'*60}\n{reply}\n{'-'*60}")
+            print(f"[{cfg.bot_name}] Ollama reply:\n{'-'*60}\n{reply}\n{'-'*60}")
             return reply
             
     except Exception as e:
-        print(f"[{BOT_NAME}] Ollama error: {e}")
+        print(f"[{cfg.bot_name}] Ollama error: {e}")
         return get_fallback_response()
 
 def get_fallback_response():
@@ -393,14 +421,6 @@ def get_fallback_response():
         "🤖 Beep boop. No thoughts. Head empty."
     ])
 
-def should_revive_conversation():
-    """Check if enough time has passed to revive the conversation"""
-    now = datetime.datetime.now(datetime.UTC)
-    time_since_last_activity = (now - last_activity_time).total_seconds()
-    # Base 3 minutes + random 2 minutes
-    revival_threshold = 180 + random.uniform(0, 120)
-    return time_since_last_activity > revival_threshold
-
 def find_interesting_message():
     """Find an interesting message from history to respond to"""
     if not conversation_history:
@@ -409,7 +429,7 @@ def find_interesting_message():
     # Filter out bot messages and very short messages
     human_messages = [
         msg for msg in conversation_history 
-        if not msg.startswith("Bot") and len(msg.split()) > 3
+        if not roster.is_bot(history_speaker(msg) or "") and len(msg.split()) > 3
     ]
     
     if not human_messages:
@@ -419,124 +439,120 @@ def find_interesting_message():
     recent_messages = human_messages[-10:]
     return random.choice(recent_messages)
 
-def conversation_revival_loop(connection):
-    """Background thread that monitors conversation activity and triggers responses"""
-    global conversation_revival_running
-    conversation_revival_running = True
-    
-    while conversation_revival_running:
-        try:
-            # Check for config/prompt updates
-            check_for_updates()
-            
-            if should_revive_conversation():
-                print(f"[{BOT_NAME}] Conversation has been quiet, attempting to revive...")
-                
-                # Find an interesting message to respond to
-                message = find_interesting_message()
-                if message:
-                    # Add the message to conversation history if it's not already there
-                    if message not in conversation_history:
-                        conversation_history.append(message)
-                    
-                    # Generate a response
-                    prompts = load_prompts()
-                    if prompts:
-                        system_override = prompts.get("system_instructions", "").strip()
-                        summary = summarize_history(conversation_history)
-                        raw_history = "\n".join(conversation_history[-CONVERSATION_HISTORY_LENGTH:])
-                        
-                        # Use a slightly modified prompt for revival
-                        prompt_template = prompts.get("regular_prompt", "")
-                        prompt = prompt_template.format(
-                            bot_name=BOT_NAME,
-                            personality=PERSONALITY,
-                            summary=summary,
-                            history=raw_history
-                        ).strip()
-                        
-                        # Add a hint that we're reviving the conversation
-                        prompt += "\n\nNote: The conversation has been quiet. Respond naturally to the last message, helping to revive the discussion."
-                        
-                        reply = generate_reply(prompt, system_override=system_override)
-                        if reply:
-                            safe = reply.replace("\r", " ").replace("\n", " ").strip()
-                            if len(safe) > 400:
-                                safe = safe[:400] + "..."
-                            
-                            log_message(BOT_NAME, safe)
-                            connection.privmsg(CHANNEL, safe)
-                            
-                            # Update last activity time
-                            global last_activity_time
-                            last_activity_time = datetime.datetime.now(datetime.UTC)
-            
-            # Check every 30 seconds
-            time.sleep(30)
-            
-        except Exception as e:
-            print(f"[{BOT_NAME}] Error in conversation revival loop: {e}")
-            time.sleep(30)  # Wait before retrying
+def revive_conversation(connection):
+    """Reply to an earlier message to restart a quiet channel. Returns False if there is nothing to reply to."""
+    message = find_interesting_message()
+    if not message:
+        return False
+
+    def revive():
+        rt = runtime
+        cfg = rt.settings
+        print(f"[{cfg.bot_name}] Conversation has been quiet, attempting to revive...")
+
+        # Add the message to conversation history if it's not already there
+        if message not in conversation_history:
+            conversation_history.append(message)
+
+        prompts = load_prompts(cfg)
+        if not prompts:
+            return
+        system_override = prompts.get("system_instructions", "").strip()
+
+        # Use the regular prompt with a hint that we're reviving the conversation
+        prompt = build_regular_prompt(
+            rt,
+            prompts,
+            message,
+            note="\n\nNote: The conversation has been quiet. Respond naturally to the last message, helping to revive the discussion."
+        )
+
+        reply = generate_reply(cfg, prompt, system_override=system_override, max_retries=REVIVAL_MAX_ATTEMPTS)
+        if reply:
+            safe = reply.replace("\r", " ").replace("\n", " ").strip()
+            if len(safe) > 400:
+                safe = safe[:400] + "..."
+
+            log_message(cfg, cfg.bot_name, safe)
+            connection.privmsg(cfg.channel, safe)
+            revival_scheduler.note_activity(f"{cfg.bot_name}: {safe}")
+
+    threading.Thread(target=revive, name="revival", daemon=True).start()
+    return True
 
 def on_connect(connection, event):
-    print(f"[{BOT_NAME}] Connected.")
+    cfg = runtime.settings
+    print(f"[{cfg.bot_name}] Connected.")
     # Send USER command explicitly
-    connection.send_raw(f"USER {BOT_NAME} 0 * :{PERSONALITY}")
+    connection.send_raw(f"USER {cfg.bot_name} 0 * :{cfg.personality}")
     # Join channel after a short delay to ensure registration is complete
     time.sleep(1)
-    connection.join(CHANNEL)
-    log_message("System", f"{BOT_NAME} has joined {CHANNEL}")
-    
-    # Start the conversation revival thread
-    global conversation_revival_thread
-    if conversation_revival_thread is None or not conversation_revival_thread.is_alive():
-        conversation_revival_thread = threading.Thread(
-            target=conversation_revival_loop,
-            args=(connection,),
-            daemon=True
-        )
-        conversation_revival_thread.start()
+    connection.join(cfg.channel)
+    log_message(cfg, "System", f"{cfg.bot_name} has joined {cfg.channel}")
+    revival_scheduler.start()
 
 def on_disconnect(connection, event):
-    print(f"[{BOT_NAME}] Disconnected. Event: {event}")
-    log_message("System", f"{BOT_NAME} has disconnected")
+    cfg = runtime.settings
+    print(f"[{cfg.bot_name}] Disconnected. Event: {event}")
+    log_message(cfg, "System", f"{cfg.bot_name} has disconnected")
     
-    # Stop the conversation revival thread
-    global conversation_revival_running
-    conversation_revival_running = False
+    revival_scheduler.stop()
     
     # Check if we should stop trying to reconnect
     if "Too many connections" in str(event) or "Connection limit exceeded" in str(event):
-        print(f"[{BOT_NAME}] Server connection limit reached. Stopping reconnection attempts.")
+        print(f"[{cfg.bot_name}] Server connection limit reached. Stopping reconnection attempts.")
         return
             
     # Try to reconnect after a delay
     time.sleep(5)
     try:
-        print(f"[{BOT_NAME}] Attempting to reconnect to {SERVER}:{PORT}...")
+        print(f"[{cfg.bot_name}] Attempting to reconnect to {cfg.server}:{cfg.port}...")
         connection.connect(
-            SERVER, PORT, BOT_NAME,
+            cfg.server, cfg.port, cfg.bot_name,
             connect_factory=irc.connection.Factory(),
             password=None,  # Add password here if needed
-            username=BOT_NAME,
-            ircname=PERSONALITY
+            username=cfg.bot_name,
+            ircname=cfg.personality
         )
     except Exception as e:
-        print(f"[{BOT_NAME}] Reconnection failed: {e}")
+        print(f"[{cfg.bot_name}] Reconnection failed: {e}")
+
+def on_join(connection, event):
+    nick = irc.client.NickMask(event.source).nick
+    if nick == connection.get_nickname():
+        # Fresh join; NAMES replies will repopulate the roster
+        roster.reset()
+    roster.add(nick)
+
+def on_namreply(connection, event):
+    # arguments: channel type, channel, space-separated nicks
+    roster.add(*event.arguments[2].split())
+
+def on_part(connection, event):
+    roster.remove(irc.client.NickMask(event.source).nick)
+
+def on_kick(connection, event):
+    roster.remove(event.arguments[0])
+
+def on_nick(connection, event):
+    roster.rename(irc.client.NickMask(event.source).nick, event.target)
 
 def on_pubmsg(connection, event):
-    # Check for config/prompt updates before processing message
+    # Check for config/prompt updates before processing message, then use
+    # one config snapshot for this message and any reply to it
     check_for_updates()
+    rt = runtime
+    cfg = rt.settings
     
-    global last_activity_time, last_message_time
-    last_activity_time = datetime.datetime.now(datetime.UTC)
+    global last_message_time
     last_message_time = time.time()
 
     msg = event.arguments[0]
     nick = irc.client.NickMask(event.source).nick
-    print(f"[{BOT_NAME}] Got message from {nick}: {msg}")
+    revival_scheduler.note_activity(f"{nick}: {msg}")
+    print(f"[{cfg.bot_name}] Got message from {nick}: {msg}")
 
-    if nick == BOT_NAME:
+    if nick == cfg.bot_name:
         return
 
     msg_key = msg.strip().lower()
@@ -547,14 +563,16 @@ def on_pubmsg(connection, event):
         recent_messages.pop()
 
     # Get response probabilities from config
-    probs = config["behavior"]["response_probabilities"]
+    probs = cfg.response_probabilities
     
     # Determine message type and corresponding probability
-    is_victoria = nick.lower() == ALWAYS_RESPOND_TO.lower()
-    is_addressed = BOT_NAME.lower() in msg.lower()
+    roster.add(nick)
+    mentioned = roster.mentions(msg)
+    is_victoria = nick.lower() == cfg.always_respond_to.lower()
+    is_addressed = any(nick.lower() == cfg.bot_name.lower() for nick in mentioned)
     is_question = msg.strip().endswith("?")
-    is_bot = nick.startswith("Bot")
-    addressed_any_bot = any(b in msg.lower() for b in ["bota", "botb", "botc", "botd", "bote"])
+    is_bot = roster.is_bot(nick)
+    addressed_any_bot = any(roster.is_bot(m) for m in mentioned)
 
     # Calculate response probability based on message type
     if is_victoria:
@@ -572,45 +590,43 @@ def on_pubmsg(connection, event):
 
     if len(msg.split()) > 80 or msg.count(":") > 3:
         return
-    if msg.startswith(f"{BOT_NAME}:"):
+    if msg.startswith(f"{cfg.bot_name}:"):
         return
 
     # Use the calculated probability to decide whether to respond
     if random.random() > response_prob:
-        print(f"[{BOT_NAME}] Decided not to respond (probability: {response_prob:.2f})")
+        print(f"[{cfg.bot_name}] Decided not to respond (probability: {response_prob:.2f})")
         return
 
-    print(f"[{BOT_NAME}] Decided to respond (probability: {response_prob:.2f})")
-    log_message(nick, msg)
+    print(f"[{cfg.bot_name}] Decided to respond (probability: {response_prob:.2f})")
+    log_message(cfg, nick, msg)
     conversation_history.append(f"{nick}: {msg}")
-    if len(conversation_history) > CONVERSATION_HISTORY_LENGTH:
+    if len(conversation_history) > cfg.conversation_history_length:
         conversation_history.pop(0)
 
     def respond():
         global last_replies
 
-        base = POST_DELAY_SECONDS
-        jitter = random.uniform(0, POST_DELAY_JITTER)
+        base = cfg.post_delay_seconds
+        jitter = random.uniform(0, cfg.post_delay_jitter)
         delay = base + jitter
-        print(f"[{BOT_NAME}] Waiting {delay:.1f}s before responding...")
+        print(f"[{cfg.bot_name}] Waiting {delay:.1f}s before responding...")
         start_time = time.time()
         time.sleep(delay)
 
         if last_message_time and last_message_time > start_time:
-            print(f"[{BOT_NAME}] Another message arrived during delay. Skipping.")
+            print(f"[{cfg.bot_name}] Another message arrived during delay. Skipping.")
             return
 
-        prompts = load_prompts()
+        prompts = load_prompts(cfg)
         if not prompts:
-            print(f"[{BOT_NAME}] Prompt file is missing or empty.")
+            print(f"[{cfg.bot_name}] Prompt file is missing or empty.")
             return
 
         system_override = prompts.get("system_instructions", "").strip()
-        summary = summarize_history(conversation_history)
-        raw_history = "\n".join(conversation_history[-CONVERSATION_HISTORY_LENGTH:])
         tone_instruction = ""
 
-        if random.random() < TONE_CHANCE:
+        if random.random() < cfg.tone_chance:
             tone = random.choice(list(prompts.get("tones", {}).keys()))
             desc = prompts["tones"][tone]
             tone_instruction = (
@@ -618,105 +634,134 @@ def on_pubmsg(connection, event):
                 "Do not think out loud, only return the actual text a human would type while chatting with another human.\n\n"
             )
 
-        if random.random() < OFF_TOPIC_CHANCE:
-            print(f"[{BOT_NAME}] Using off-topic prompt.")
+        if random.random() < cfg.off_topic_chance:
+            print(f"[{cfg.bot_name}] Using off-topic prompt.")
             prompt_template = prompts.get("off_topic_prompt", "")
-            prompt = prompt_template.format(bot_name=BOT_NAME, personality=PERSONALITY).strip()
+            prompt = prompt_template.format(bot_name=cfg.bot_name, personality=cfg.personality).strip()
         else:
-            print(f"[{BOT_NAME}] Using regular prompt.")
-            prompt_template = prompts.get("regular_prompt", "")
-            prompt = prompt_template.format(
-                bot_name=BOT_NAME,
-                personality=PERSONALITY,
-                summary=summary,
-                history=raw_history
-            ).strip()
-            prompt = f"{tone_instruction}{prompt}"
-
-        reply = generate_reply(prompt, system_override=system_override)
+            print(f"[{cfg.bot_name}] Using regular prompt.")
+            prompt = build_regular_prompt(rt, prompts, msg, tone_instruction=tone_instruction)
+
+        reply = generate_reply(cfg, prompt, system_override=system_override)
         if not reply:
-            print(f"[{BOT_NAME}] Empty reply, skipping send.")
+            print(f"[{cfg.bot_name}] Empty reply, skipping send.")
             return
 
         last_replies.append(reply)
         if len(last_replies) > 5:
             last_replies.pop(0)
 
-        conversation_history.append(f"{BOT_NAME}: {reply}")
+        conversation_history.append(f"{cfg.bot_name}: {reply}")
         safe = reply.replace("\r", " ").replace("\n", " ").strip()
         if len(safe) > 400:
             safe = safe[:400] + "..."
 
-        log_message(BOT_NAME, safe)
-        connection.privmsg(CHANNEL, safe)
+        log_message(cfg, cfg.bot_name, safe)
+        connection.privmsg(cfg.channel, safe)
+        revival_scheduler.note_activity(f"{cfg.bot_name}: {safe}")
 
-    threading.Thread(target=respond).start()
+    threading.Thread(target=respond, name=f"reply-{nick}").start()
+
+def on_profile_signal(signum, frame):
+    """Start (or stop early) a profiling session; see profiling.Profiler"""
+    cfg = runtime.settings
+    profiler.toggle(
+        cfg.log_dir,
+        duration=cfg.profile_duration_seconds,
+        interval=cfg.profile_sample_interval_ms / 1000
+    )
 
 def main():
+    global revival_scheduler
+    cfg = runtime.settings
+    ollama_pool.start()
+    # SIGUSR1 toggles profiling; not available on Windows
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, on_profile_signal)
     reactor = irc.client.Reactor()
     try:
-        print(f"[{BOT_NAME}] Attempting to connect to {SERVER}:{PORT}...")
+        print(f"[{cfg.bot_name}] Attempting to connect to {cfg.server}:{cfg.port}...")
         conn = reactor.server().connect(
-            SERVER, PORT, BOT_NAME,
+            cfg.server, cfg.port, cfg.bot_name,
             connect_factory=irc.connection.Factory(),
             password=None,  # Add password here if needed
-            username=BOT_NAME,
-            ircname=PERSONALITY
+            username=cfg.bot_name,
+            ircname=cfg.personality
         )
-        print(f"[{BOT_NAME}] Connection object created successfully")
+        print(f"[{cfg.bot_name}] Connection object created successfully")
     except irc.client.ServerConnectionError as e:
-        print(f"[{BOT_NAME}] Failed to connect: {e}")
+        print(f"[{cfg.bot_name}] Failed to connect: {e}")
         return
     except Exception as e:
-        print(f"[{BOT_NAME}] Unexpected error during connection: {e}")
+        print(f"[{cfg.bot_name}] Unexpected error during connection: {e}")
         return
 
+    # Timers run on the reactor thread between socket reads; no polling threads
+    revival_scheduler = RevivalScheduler(
+        cfg.bot_name,
+        schedule=reactor.scheduler.execute_after,
+        candidates=lambda: [nick for nick in roster.members if roster.is_bot(nick)],
+        revive=lambda: revive_conversation(conn)
+    )
+    configure_revival(revival_scheduler, cfg)
+    reactor.scheduler.execute_every(CONFIG_CHECK_INTERVAL, check_for_updates)
+
     def on_welcome(connection, event):
-        print(f"[{BOT_NAME}] Received welcome event: {event}")
+        cfg = runtime.settings
+        print(f"[{cfg.bot_name}] Received welcome event: {event}")
         on_connect(connection, event)
 
     def on_disconnect(connection, event):
-        print(f"[{BOT_NAME}] Disconnected. Event: {event}")
-        log_message("System", f"{BOT_NAME} has disconnected")
+        cfg = runtime.settings
+        print(f"[{cfg.bot_name}] Disconnected. Event: {event}")
+        log_message(cfg, "System", f"{cfg.bot_name} has disconnected")
+        revival_scheduler.stop()
         
         # Check if we should stop trying to reconnect
         if "Too many connections" in str(event) or "Connection limit exceeded" in str(event):
-            print(f"[{BOT_NAME}] Server connection limit reached. Stopping reconnection attempts.")
+            print(f"[{cfg.bot_name}] Server connection limit reached. Stopping reconnection attempts.")
             return
             
         # Try to reconnect after a delay
         time.sleep(5)
         try:
-            print(f"[{BOT_NAME}] Attempting to reconnect to {SERVER}:{PORT}...")
+            print(f"[{cfg.bot_name}] Attempting to reconnect to {cfg.server}:{cfg.port}...")
             connection.connect(
-                SERVER, PORT, BOT_NAME,
+                cfg.server, cfg.port, cfg.bot_name,
                 connect_factory=irc.connection.Factory(),
                 password=None,  # Add password here if needed
-                username=BOT_NAME,
-                ircname=PERSONALITY
+                username=cfg.bot_name,
+                ircname=cfg.personality
             )
         except Exception as e:
-            print(f"[{BOT_NAME}] Reconnection failed: {e}")
+            print(f"[{cfg.bot_name}] Reconnection failed: {e}")
 
     def on_error(connection, event):
-        print(f"[{BOT_NAME}] Error event received: {event}")
+        cfg = runtime.settings
+        print(f"[{cfg.bot_name}] Error event received: {event}")
         if "Too many connections" in str(event) or "Connection limit exceeded" in str(event):
-            print(f"[{BOT_NAME}] Server connection limit reached. Please disconnect another bot first.")
+            print(f"[{cfg.bot_name}] Server connection limit reached. Please disconnect another bot first.")
             connection.disconnect()
 
     conn.add_global_handler("welcome", on_welcome)
     conn.add_global_handler("disconnect", on_disconnect)
     conn.add_global_handler("error", on_error)
     conn.add_global_handler("pubmsg", on_pubmsg)
+    conn.add_global_handler("join", on_join)
+    conn.add_global_handler("namreply", on_namreply)
+    conn.add_global_handler("part", on_part)
+    conn.add_global_handler("quit", on_part)
+    conn.add_global_handler("kick", on_kick)
+    conn.add_global_handler("nick", on_nick)
 
     try:
-        print(f"[{BOT_NAME}] Starting reactor...")
+        print(f"[{cfg.bot_name}] Starting reactor...")
         reactor.process_forever()
     except KeyboardInterrupt:
-        print(f"\n[{BOT_NAME}] Shutting down...")
+        print(f"\n[{cfg.bot_name}] Shutting down...")
         conn.disconnect()
     except Exception as e:
-        print(f"[{BOT_NAME}] Error in main loop: {e}")
+        print(f"[{cfg.bot_name}] Error in main loop: {e}")
         conn.disconnect()
 
 if __name__ == "__main__":
@@ -0,0 +1,317 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Compact the index file once the segments appended since the last compaction
+# outgrow the compacted part (but never for less than this many bytes). This
+# keeps total index I/O linear in the size of the log.
+MIN_COMPACT_BYTES = 64 * 1024
+
+# Seconds the writer waits before retrying after a failed index write
+WRITE_RETRY_SECONDS = 30
+
+LOG_LINE_RE = re.compile(r"^\[(?P<timestamp>[^\]]+)\] (?P<nick>[^:]+): (?P<text>.*)$")
+TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "do", "for", "from",
+    "has", "have", "he", "her", "his", "i", "if", "in", "is", "it", "its", "it's",
+    "just", "me", "my", "no", "not", "of", "on", "or", "so", "that", "the", "their",
+    "them", "they", "this", "to", "too", "was", "we", "what", "with", "you", "your",
+}
+
+
+def read_segments(path):
+    """Intact segments at the start of the index file at path, and their size in bytes.
+
+    Reading stops at the first torn, unparseable or out-of-sequence line;
+    everything from there on is garbage for the writer to cut off.
+    """
+    segments = []
+    size = 0
+    num_docs = 0
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return segments, size
+    with f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                segment = json.loads(line)
+                if segment["first_doc"] != num_docs:
+                    break
+                num_docs += len(segment["docs"])
+            except Exception:
+                break
+            segments.append(segment)
+            size += len(line)
+    return segments, size
+
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords and single characters removed"""
+    return [
+        token for token in TOKEN_RE.findall(text.lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+class ChatMemory:
+    """BM25 inverted index over a bot's chat log.
+
+    The log written by log_message is the source of truth. refresh() indexes
+    whatever has been appended since the last call. Documents are stored as
+    (offset, length) into the log, so the index never copies message text;
+    search() reads the few lines it returns back from the log.
+
+    The on-disk index is append-only: each refresh that adds lines queues one
+    segment (its documents, postings and the log offset it covers) and a
+    background writer appends it to the index file, compacting the file into
+    a single segment once the appended part outgrows the compacted part.
+    Nothing is written on the caller's thread. A restart loads the segments
+    and only has to catch up on the tail of the log.
+
+    The writer only ever appends after the last segment it knows to be
+    intact, truncating anything beyond it first. A tail torn by a crash or
+    a failed write is therefore cut off by the next write, and the lines it
+    covered are re-indexed from the log once instead of on every restart.
+    """
+
+    def __init__(self, log_path, index_path, name="memory"):
+        self.log_path = Path(log_path)
+        self.index_path = Path(index_path)
+        self.name = name
+        self._lock = threading.Lock()
+        self._reset()
+        self._load()
+
+        # Timings of the most recent refresh and query, in milliseconds
+        self.last_update_ms = 0.0
+        self.last_query_ms = 0.0
+
+        # Pending writes for the background writer: ("segment", dict) or ("reset", None)
+        self._pending = []
+        self._pending_cond = threading.Condition()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name=f"memory-{name}", daemon=True)
+        self._writer.start()
+
+    def _reset(self):
+        self.docs = []
+        self.postings = {}
+        self.total_length = 0
+        self.log_offset = 0
+
+    def _load(self):
+        """Load every intact segment; the writer truncates whatever follows them"""
+        segments, self._index_size = read_segments(self.index_path)
+        for segment in segments:
+            self._merge(segment)
+
+    def _merge(self, segment):
+        self.docs.extend(segment["docs"])
+        self.total_length += sum(doc[2] for doc in segment["docs"])
+        for term, postings in segment["postings"].items():
+            self.postings.setdefault(term, []).extend(postings)
+        self.log_offset = segment["end"]
+
+    def refresh(self):
+        """Index lines appended to the log since the last refresh. Returns the number of new lines."""
+        start = time.perf_counter()
+        try:
+            with self._lock:
+                return self._refresh()
+        finally:
+            self.last_update_ms = (time.perf_counter() - start) * 1000
+
+    def _refresh(self):
+        try:
+            size = self.log_path.stat().st_size
+        except FileNotFoundError:
+            return 0
+        if size < self.log_offset:
+            # Log was truncated or rotated; rebuild from scratch
+            self._reset()
+            self._queue("reset", None)
+        if size == self.log_offset:
+            return 0
+
+        with open(self.log_path, "rb") as f:
+            f.seek(self.log_offset)
+            chunk = f.read(size - self.log_offset)
+        # Only consume complete lines; a partial trailing line is picked up next time
+        end = chunk.rfind(b"\n") + 1
+
+        segment = {"first_doc": len(self.docs), "docs": [], "postings": {}}
+        position = 0
+        while position < end:
+            line_end = chunk.index(b"\n", position) + 1
+            raw = chunk[position:line_end]
+            match = LOG_LINE_RE.match(raw.decode("utf-8", errors="replace").rstrip("\r\n"))
+            if match and match.group("nick") != "System":
+                self._add(segment, self.log_offset + position, len(raw), match.group("text"))
+            position = line_end
+
+        self.log_offset += end
+        segment["end"] = self.log_offset
+        self._queue("segment", segment)
+        return len(segment["docs"])
+
+    def _add(self, segment, offset, length, text):
+        tokens = tokenize(text)
+        if not tokens:
+            return
+        doc_id = len(self.docs)
+        doc = [offset, length, len(tokens)]
+        self.docs.append(doc)
+        segment["docs"].append(doc)
+        self.total_length += len(tokens)
+        for term, tf in Counter(tokens).items():
+            posting = [doc_id, tf]
+            self.postings.setdefault(term, []).append(posting)
+            segment["postings"].setdefault(term, []).append(posting)
+
+    def _read_line(self, log, doc):
+        """The "nick: text" line for doc, read back from the log"""
+        offset, length, _ = doc
+        log.seek(offset)
+        match = LOG_LINE_RE.match(log.read(length).decode("utf-8", errors="replace").rstrip("\r\n"))
+        return f"{match.group('nick')}: {match.group('text')}" if match else None
+
+    def search(self, query, limit=3, exclude=()):
+        """Return up to limit (score, "nick: text") pairs ranked by BM25 against query"""
+        start = time.perf_counter()
+        terms = set(tokenize(query))
+        scores = {}
+        results = []
+        try:
+            with self._lock:
+                num_docs = len(self.docs)
+                if not num_docs or not terms:
+                    return results
+                avg_length = self.total_length / num_docs
+                for term in terms:
+                    postings = self.postings.get(term)
+                    if not postings:
+                        continue
+                    df = len(postings)
+                    idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+                    for doc_id, tf in postings:
+                        length = self.docs[doc_id][2]
+                        norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                        scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+
+                seen = set(exclude)
+                with open(self.log_path, "rb") as log:
+                    for doc_id in sorted(scores, key=scores.get, reverse=True):
+                        line = self._read_line(log, self.docs[doc_id])
+                        if line is None or line in seen:
+                            continue
+                        seen.add(line)
+                        results.append((scores[doc_id], line))
+                        if len(results) >= limit:
+                            break
+            return results
+        finally:
+            self.last_query_ms = (time.perf_counter() - start) * 1000
+
+    def recall(self, query, max_lines=3, max_chars=500, exclude=()):
+        """Relevant past lines for query, bounded to max_lines and max_chars in total"""
+        lines = []
+        remaining = max_chars
+        for _, line in self.search(query, limit=max_lines, exclude=exclude):
+            if remaining <= 0:
+                break
+            if len(line) > remaining:
+                line = line[:max(remaining - 3, 0)].rstrip() + "..."
+            lines.append(line)
+            remaining -= len(line) + 1
+        return "\n".join(lines)
+
+    def _queue(self, kind, segment):
+        with self._pending_cond:
+            self._pending.append((kind, segment))
+            self._pending_cond.notify()
+
+    def close(self, timeout=5):
+        """Write out queued segments and stop the writer thread"""
+        with self._pending_cond:
+            self._closed = True
+            self._pending_cond.notify()
+        self._writer.join(timeout)
+
+    def _write_loop(self):
+        # Size of the intact part of the index file; nothing past it is trusted
+        good_size = self._index_size
+        compacted_size = good_size
+        appended = 0
+
+        while True:
+            with self._pending_cond:
+                while not self._pending and not self._closed:
+                    self._pending_cond.wait()
+                pending, self._pending = self._pending, []
+                closed = self._closed
+
+            try:
+                self.index_path.parent.mkdir(parents=True, exist_ok=True)
+                while pending:
+                    kind, segment = pending[0]
+                    if kind == "reset":
+                        good_size, compacted_size, appended = 0, 0, 0
+                        with open(self.index_path, "wb"):
+                            pass
+                    else:
+                        data = (json.dumps(segment, separators=(",", ":")) + "\n").encode("utf-8")
+                        with open(self.index_path, "ab") as f:
+                            f.truncate(good_size)
+                            f.write(data)
+                        good_size += len(data)
+                        appended += len(data)
+                    pending.pop(0)
+
+                if appended > max(compacted_size, MIN_COMPACT_BYTES):
+                    good_size = compacted_size = self._compact()
+                    appended = 0
+            except Exception as e:
+                if closed:
+                    # Shutting down; the lines are re-indexed from the log on the next start
+                    print(f"[{self.name}] Failed to write memory index {self.index_path}: {e}")
+                    return
+                print(f"[{self.name}] Failed to write memory index {self.index_path}, "
+                      f"retrying in {WRITE_RETRY_SECONDS}s: {e}")
+                with self._pending_cond:
+                    self._pending[:0] = pending
+                    self._pending_cond.wait(WRITE_RETRY_SECONDS)
+                continue
+
+            if closed:
+                return
+
+    def _compact(self):
+        """Merge the index file's segments into one and return its size. Runs on the writer thread only."""
+        segments, _ = read_segments(self.index_path)
+        merged = {"first_doc": 0, "docs": [], "postings": {}, "end": 0}
+        for segment in segments:
+            merged["docs"].extend(segment["docs"])
+            for term, postings in segment["postings"].items():
+                merged["postings"].setdefault(term, []).extend(postings)
+            merged["end"] = segment["end"]
+
+        data = (json.dumps(merged, separators=(",", ":")) + "\n").encode("utf-8")
+        tmp_path = self.index_path.with_suffix(self.index_path.suffix + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.index_path)
+        return len(data)
@@ -0,0 +1,46 @@
+import threading
+
+
+class ResizableSemaphore:
+    """A counting semaphore whose limit can be changed while it is in use.
+
+    Raising the limit wakes waiters straight away. Lowering it never
+    interrupts holders; new acquirers simply wait until enough of the
+    in-flight work has released to get under the new limit.
+    """
+
+    def __init__(self, limit):
+        self._cond = threading.Condition()
+        self._limit = max(1, limit)
+        self._in_use = 0
+
+    @property
+    def limit(self):
+        return self._limit
+
+    @property
+    def in_use(self):
+        return self._in_use
+
+    def set_limit(self, limit):
+        with self._cond:
+            self._limit = max(1, limit)
+            self._cond.notify_all()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_use >= self._limit:
+                self._cond.wait()
+            self._in_use += 1
+
+    def release(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
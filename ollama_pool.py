@@ -0,0 +1,222 @@
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+
+# How much worse (by load score) a model's sticky backend may be than the best
+# candidate before we move the model elsewhere. Moving costs a model load on the
+# new box, so we only do it when the current one is clearly busier.
+STICKY_SLACK = 2.0
+
+# Weight given to the newest sample in the latency moving average
+LATENCY_ALPHA = 0.3
+
+
+def parse_ollama_urls(value):
+    """Normalise an ollama.url setting (string, comma-separated string or list) to a list of URLs"""
+    if isinstance(value, str):
+        value = value.split(",")
+    return [url.strip() for url in value if url and url.strip()]
+
+
+class OllamaBackend:
+    """A single Ollama endpoint and its routing statistics"""
+
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True
+        self.in_flight = 0
+        self.avg_latency = None
+        self.avg_embed_latency = None
+        self.consecutive_failures = 0
+        self.last_error = None
+
+        parts = urlsplit(url)
+        self.health_url = urlunsplit((parts.scheme, parts.netloc, "/api/tags", "", ""))
+        self.embed_url = urlunsplit((parts.scheme, parts.netloc, "/api/embed", "", ""))
+
+    def load_score(self):
+        """Lower is better: outstanding requests weighted by recent latency"""
+        return (self.in_flight + 1) * (self.avg_latency or 1.0)
+
+    def record_success(self, latency, embed=False):
+        # Embeddings are far quicker than generations; averaging them together
+        # would make a backend that serves many embeds look idle
+        attr = "avg_embed_latency" if embed else "avg_latency"
+        average = getattr(self, attr)
+        if average is not None:
+            latency = LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * average
+        setattr(self, attr, latency)
+        self.consecutive_failures = 0
+        self.healthy = True
+
+    def record_failure(self, error):
+        self.consecutive_failures += 1
+        self.last_error = str(error)
+        self.healthy = False
+
+    def __repr__(self):
+        return f"OllamaBackend({self.url!r}, healthy={self.healthy}, in_flight={self.in_flight})"
+
+
+class OllamaPool:
+    """Routes generate requests across several Ollama backends.
+
+    Each request goes to the least-loaded healthy backend, except that a model
+    sticks to the backend it last ran on for as long as that backend stays
+    reasonably competitive. Failed backends are taken out of rotation and a
+    background thread probes them until they answer again.
+    """
+
+    def __init__(self, urls, name="ollama", health_check_interval=10, probe_timeout=5):
+        self.name = name
+        self.health_check_interval = health_check_interval
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._backends = []
+        self._affinity = {}
+        self._health_thread = None
+        self._running = False
+        self.set_backends(urls)
+
+    def set_backends(self, urls):
+        """Replace the backend list, keeping statistics for URLs that are still present"""
+        urls = parse_ollama_urls(urls)
+        if not urls:
+            raise ValueError("At least one Ollama URL is required")
+        with self._lock:
+            existing = {backend.url: backend for backend in self._backends}
+            self._backends = [existing.get(url) or OllamaBackend(url) for url in urls]
+            self._affinity = {
+                model: url for model, url in self._affinity.items() if url in urls
+            }
+
+    @property
+    def backends(self):
+        with self._lock:
+            return list(self._backends)
+
+    def start(self):
+        """Start the background health probe thread"""
+        if self._health_thread is not None and self._health_thread.is_alive():
+            return
+        self._running = True
+        self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def stop(self):
+        self._running = False
+
+    def _health_loop(self):
+        while self._running:
+            time.sleep(self.health_check_interval)
+            try:
+                self.probe_unhealthy()
+            except Exception as e:
+                print(f"[{self.name}] Error in Ollama health check: {e}")
+
+    def probe_unhealthy(self):
+        """Probe every out-of-rotation backend and restore the ones that answer"""
+        for backend in [b for b in self.backends if not b.healthy]:
+            try:
+                response = httpx.get(backend.health_url, timeout=self.probe_timeout)
+                response.raise_for_status()
+            except Exception as e:
+                backend.last_error = str(e)
+                continue
+            with self._lock:
+                backend.healthy = True
+                backend.consecutive_failures = 0
+            print(f"[{self.name}] Ollama backend {backend.url} is back in rotation")
+
+    def _choose(self, model, exclude):
+        """Pick a backend for model, preferring its sticky backend. Caller holds the lock."""
+        candidates = [b for b in self._backends if b.healthy and b.url not in exclude]
+        if not candidates:
+            # Nothing is known to be healthy; try the rest rather than give up outright
+            candidates = [b for b in self._backends if b.url not in exclude]
+        if not candidates:
+            return None
+
+        best = min(candidates, key=OllamaBackend.load_score)
+        sticky_url = self._affinity.get(model)
+        for backend in candidates:
+            if backend.url == sticky_url and backend.load_score() <= best.load_score() * STICKY_SLACK:
+                return backend
+        self._affinity[model] = best.url
+        return best
+
+    def count_tokens(self, model, texts, num_ctx=None, timeout=10, max_attempts=1):
+        """Exact token counts of texts using model's tokenizer, in one request.
+
+        Pass the num_ctx used for generation: a different value makes Ollama
+        reload the model to embed, and stops it truncating long input.
+
+        Ollama only reports the total for a batch, so with several texts the
+        total is shared out in proportion to their lengths. The total also
+        includes the special tokens Ollama adds once per request.
+        """
+        if not texts:
+            return []
+        payload = {"model": model, "input": list(texts), "truncate": False}
+        if num_ctx is not None:
+            payload["options"] = {"num_ctx": num_ctx}
+        total = self._request(payload, timeout, max_attempts, embed=True)["prompt_eval_count"]
+
+        lengths = [max(len(text), 1) for text in payload["input"]]
+        shares = [total * length / sum(lengths) for length in lengths]
+        counts = [int(share) for share in shares]
+        # Hand the rounding remainder to the texts that lost the most to it
+        by_remainder = sorted(range(len(shares)), key=lambda i: counts[i] - shares[i])
+        for i in by_remainder[:total - sum(counts)]:
+            counts[i] += 1
+        return counts
+
+    def generate(self, payload, timeout=350, max_attempts=None):
+        """POST payload to the best backend, failing over to others on error.
+
+        Returns the decoded JSON response. Raises the last error once every
+        attempted backend has failed.
+        """
+        return self._request(payload, timeout, max_attempts)
+
+    def _request(self, payload, timeout, max_attempts, embed=False):
+        """Send payload to /api/embed or the generate URL with routing, failover and accounting"""
+        model = payload.get("model")
+        attempts = max_attempts or len(self.backends)
+        tried = set()
+        last_error = None
+
+        for _ in range(attempts):
+            with self._lock:
+                backend = self._choose(model, tried)
+                if backend is None:
+                    break
+                backend.in_flight += 1
+            tried.add(backend.url)
+
+            start = time.monotonic()
+            try:
+                url = backend.embed_url if embed else backend.url
+                response = httpx.post(url, json=payload, timeout=timeout)
+                response.raise_for_status()
+                data = response.json()
+            except Exception as e:
+                last_error = e
+                with self._lock:
+                    backend.in_flight -= 1
+                    backend.record_failure(e)
+                    if self._affinity.get(model) == backend.url:
+                        del self._affinity[model]
+                print(f"[{self.name}] Ollama backend {backend.url} failed, taking it out of rotation: {e}")
+                continue
+
+            with self._lock:
+                backend.in_flight -= 1
+                backend.record_success(time.monotonic() - start, embed=embed)
+            return data
+
+        if last_error is None:
+            last_error = RuntimeError("No Ollama backends available")
+        raise last_error
@@ -0,0 +1,153 @@
+import datetime
+import os
+import sys
+import threading
+import traceback
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+# Number of frames tracemalloc keeps per allocation
+TRACEMALLOC_FRAMES = 25
+
+# How many entries to write in the memory reports
+TOP_ALLOCATIONS = 30
+
+
+def format_thread_stacks():
+    """Current stack of every thread, labelled with thread names"""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    sections = []
+    for ident, frame in sys._current_frames().items():
+        name = names.get(ident, "unknown")
+        stack = "".join(traceback.format_stack(frame))
+        sections.append(f"--- Thread {name} ({ident}) ---\n{stack}")
+    return "\n".join(sections)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class Profiler:
+    """On-demand sampling profiler with tracemalloc snapshots.
+
+    Nothing runs until toggle() is called: there are no hooks installed and
+    no sampling thread while it is off. A session samples the stacks of every
+    thread at a fixed interval for a set duration, then writes to output_dir:
+
+    - <prefix>.stacks.txt: collapsed stacks ("thread;outer;...;inner count"),
+      ready for flamegraph.pl or speedscope
+    - <prefix>.memory.txt: top allocations and growth over the session
+    - <prefix>.threads.txt: stacks of all threads at the start and end
+    """
+
+    def __init__(self, name="bot"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def toggle(self, output_dir, duration=30, interval=0.01):
+        """Start a session, or stop the running one early.
+
+        Safe to call from a signal handler: a second signal can interrupt
+        toggle() on the same thread, and blocking on the lock there would
+        deadlock, so that signal is ignored instead.
+        """
+        if not self._lock.acquire(blocking=False):
+            print(f"[{self.name}] Profiler is busy starting or stopping; ignoring signal")
+            return
+        try:
+            if self.running:
+                print(f"[{self.name}] Stopping profiling session early")
+                self._stop.set()
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(Path(output_dir), duration, interval, self._stop),
+                name="profiler",
+                daemon=True
+            )
+            self._thread.start()
+        finally:
+            self._lock.release()
+
+    def _run(self, output_dir, duration, interval, stop):
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        prefix = output_dir / f"profile-{self.name}-{stamp}"
+        print(f"[{self.name}] Profiling for {duration}s, writing to {prefix}.*")
+
+        try:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            thread_dumps = [f"=== Threads at start ===\n{format_thread_stacks()}"]
+
+            started_tracemalloc = not tracemalloc.is_tracing()
+            if started_tracemalloc:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            first_snapshot = tracemalloc.take_snapshot()
+
+            samples, num_samples = self._sample(duration, interval, stop)
+
+            last_snapshot = tracemalloc.take_snapshot()
+            if started_tracemalloc:
+                tracemalloc.stop()
+            thread_dumps.append(f"=== Threads at end ===\n{format_thread_stacks()}")
+
+            # Cheapest first; the memory report can take a while on a busy heap
+            with open(f"{prefix}.threads.txt", "w", encoding="utf-8") as f:
+                f.write("\n\n".join(thread_dumps))
+            with open(f"{prefix}.stacks.txt", "w", encoding="utf-8") as f:
+                for stack, count in samples.most_common():
+                    f.write(f"{stack} {count}\n")
+            with open(f"{prefix}.memory.txt", "w", encoding="utf-8") as f:
+                f.write(self._format_memory(first_snapshot, last_snapshot))
+
+            print(f"[{self.name}] Profiling finished: {num_samples} samples written to {prefix}.*")
+        except Exception as e:
+            print(f"[{self.name}] Profiling failed: {e}")
+
+    def _sample(self, duration, interval, stop):
+        """Collect collapsed stacks of all other threads until duration passes or stop is set"""
+        own_ident = threading.get_ident()
+        samples = Counter()
+        num_samples = 0
+        deadline = datetime.datetime.now() + datetime.timedelta(seconds=duration)
+
+        while not stop.is_set() and datetime.datetime.now() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, "unknown"))
+                samples[";".join(reversed(labels))] += 1
+            num_samples += 1
+            stop.wait(interval)
+
+        return samples, num_samples
+
+    def _format_memory(self, first_snapshot, last_snapshot):
+        lines = [f"=== Top {TOP_ALLOCATIONS} allocation sites still live at end ==="]
+        for stat in last_snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+            lines.append(str(stat))
+        lines.append("")
+        lines.append(f"=== Top {TOP_ALLOCATIONS} changes since session start ===")
+        for stat in last_snapshot.compare_to(first_snapshot, "lineno")[:TOP_ALLOCATIONS]:
+            lines.append(str(stat))
+        lines.append("")
+        lines.append("=== Largest allocation traceback ===")
+        top = last_snapshot.statistics("traceback")[:1]
+        for stat in top:
+            lines.append(f"{stat.count} blocks, {stat.size / 1024:.1f} KiB")
+            lines.extend(stat.traceback.format())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,229 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds to stop asking Ollama for exact counts after a tokenizer call fails
+EXACT_RETRY_SECONDS = 60
+
+# Stands in for an empty summary or memory section in the prompt
+EMPTY_SECTION = "(none)"
+
+
+def estimate_tokens(text):
+    """Cheap token estimate: roughly 4 characters or 0.75 words per token, whichever is larger"""
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), math.ceil(len(text.split()) * 4 / 3))
+
+
+class TokenCounter:
+    """Counts tokens line by line, optionally using an exact tokenizer.
+
+    exact_fn(lines) -> [int] counts a batch of lines in one call; results are
+    cached per line. prefetch() sends every uncached line of a prompt in a
+    single batch, so a prompt costs at most one tokenizer call up front. If
+    exact_fn is missing or fails, the local estimate is used instead, and
+    exact counting is paused for a while so a dead backend does not slow
+    every prompt down.
+
+    The counter is shared between threads, so it keeps no record of how it
+    counted; pass a PromptUsage to count() to have each line tallied there.
+    """
+
+    def __init__(self, exact_fn=None, cache_size=4096):
+        self.exact_fn = exact_fn
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._exact_paused_until = 0
+
+    def _exact_available(self):
+        return self.exact_fn is not None and time.time() >= self._exact_paused_until
+
+    def prefetch(self, texts):
+        """Count the uncached lines of texts with one exact_fn call"""
+        if not self._exact_available():
+            return
+        with self._lock:
+            lines = list(dict.fromkeys(
+                line for text in texts if text for line in text.split("\n")
+                if line and line not in self._cache
+            ))
+        self._fetch(lines)
+
+    def _fetch(self, lines):
+        """Exact counts of lines, cached; None if the tokenizer failed"""
+        if not lines:
+            return []
+        try:
+            counts = self.exact_fn(lines)
+        except Exception as e:
+            print(f"Exact token count failed, using estimates for {EXACT_RETRY_SECONDS}s: {e}")
+            self._exact_paused_until = time.time() + EXACT_RETRY_SECONDS
+            return None
+
+        with self._lock:
+            for line, tokens in zip(lines, counts):
+                self._cache[line] = tokens
+                self._cache.move_to_end(line)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return counts
+
+    def count_line(self, line):
+        """Token count of a single line and whether it is exact, as (tokens, exact)"""
+        if not line:
+            return 0, True
+        if not self._exact_available():
+            return estimate_tokens(line), False
+
+        with self._lock:
+            if line in self._cache:
+                self._cache.move_to_end(line)
+                return self._cache[line], True
+
+        counts = self._fetch([line])
+        if counts is None:
+            return estimate_tokens(line), False
+        return counts[0], True
+
+    def count(self, text, usage=None):
+        """Token count of text, summed over its lines (newlines count as one token each)"""
+        if not text:
+            return 0
+        lines = text.split("\n")
+        total = len(lines) - 1
+        for line in lines:
+            tokens, exact = self.count_line(line)
+            total += tokens
+            if usage is not None and line:
+                usage.note_count(exact)
+        return total
+
+
+class PromptUsage:
+    """How a prompt's token budget was spent, section by section"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.sections = OrderedDict()
+        self.exact_lines = 0
+        self.estimated_lines = 0
+
+    def add(self, section, tokens, lines=None):
+        self.sections[section] = (tokens, lines)
+
+    def note_count(self, exact):
+        if exact:
+            self.exact_lines += 1
+        else:
+            self.estimated_lines += 1
+
+    @property
+    def method(self):
+        """How this prompt's lines were counted: exact, estimated or mixed"""
+        if self.exact_lines and self.estimated_lines:
+            return "mixed"
+        return "exact" if self.exact_lines else "estimated"
+
+    @property
+    def total(self):
+        return sum(tokens for tokens, _ in self.sections.values())
+
+    def describe(self):
+        parts = []
+        for section, (tokens, lines) in self.sections.items():
+            if lines is None:
+                parts.append(f"{section} {tokens}")
+            else:
+                parts.append(f"{section} {tokens}/{lines} lines")
+        return f"{self.total}/{self.budget} tokens ({', '.join(parts)})"
+
+
+def build_prompt(template, fields, history, counter, budget,
+                 memory=(), tone="", summarize=None):
+    """Fill template within budget tokens, by priority.
+
+    Sections are filled in this order until the budget runs out:
+
+    1. the template itself and the newest history line (always included)
+    2. the tone instruction
+    3. recalled memory lines
+    4. older history lines, newest first
+    5. a summary (via summarize) of the history lines that did not fit
+
+    The template cost includes the placeholders that stand in for an empty
+    summary or memory section, so the prompt fits whichever sections end up
+    empty.
+
+    Returns (prompt, PromptUsage).
+    """
+    usage = PromptUsage(budget)
+    history = list(history)
+    memory = list(memory)
+
+    skeleton = template.format(**fields, history="", summary=EMPTY_SECTION, memory=EMPTY_SECTION).strip()
+    counter.prefetch([skeleton, tone, *memory, *history])
+    remaining = budget - counter.count(skeleton, usage)
+    usage.add("template", budget - remaining)
+
+    kept_history = []
+    history_tokens = 0
+    if history:
+        cost = counter.count(history[-1], usage) + 1
+        kept_history.append(history[-1])
+        history_tokens += cost
+        remaining -= cost
+
+    tone_tokens = counter.count(tone, usage)
+    if tone and tone_tokens <= remaining:
+        remaining -= tone_tokens
+    else:
+        tone, tone_tokens = "", 0
+    usage.add("tone", tone_tokens)
+
+    kept_memory = []
+    memory_tokens = 0
+    for line in memory:
+        cost = counter.count(line, usage) + 1
+        if cost > remaining:
+            continue
+        kept_memory.append(line)
+        memory_tokens += cost
+        remaining -= cost
+    usage.add("memory", memory_tokens, len(kept_memory))
+
+    older = history[:-1]
+    while older:
+        cost = counter.count(older[-1], usage) + 1
+        if cost > remaining:
+            break
+        kept_history.append(older.pop())
+        history_tokens += cost
+        remaining -= cost
+    kept_history.reverse()
+    usage.add("history", history_tokens, len(kept_history))
+
+    summary_lines = []
+    summary_tokens = 0
+    if older and summarize is not None:
+        candidates = [line for line in summarize(older).split("\n") if line]
+        counter.prefetch(candidates)
+        while candidates:
+            cost = counter.count(candidates[-1], usage) + 1
+            if cost > remaining:
+                break
+            summary_lines.append(candidates.pop())
+            summary_tokens += cost
+            remaining -= cost
+        summary_lines.reverse()
+    usage.add("summary", summary_tokens, len(summary_lines))
+
+    prompt = template.format(
+        **fields,
+        history="\n".join(kept_history),
+        summary="\n".join(summary_lines) or EMPTY_SECTION,
+        memory="\n".join(kept_memory) or EMPTY_SECTION
+    ).strip()
+    return f"{tone}{prompt}", usage
@@ -0,0 +1,156 @@
+import hashlib
+import threading
+import time
+
+
+def _seeded_fraction(*parts):
+    """Deterministic number in [0, 1) from parts, identical in every process"""
+    digest = hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) / 0x100000000
+
+
+class RevivalScheduler:
+    """Decides when, and which bot, revives a quiet channel.
+
+    There is no polling thread: a single timer entry is kept on the reactor's
+    scheduler and fires only at the next moment revival could become due.
+    Channel activity just records the time and the line that was said; when
+    the timer fires it re-arms itself for the new deadline if there has been
+    activity since. While a channel is busy that is at most one wakeup per
+    idle_seconds.
+
+    Every bot in a channel sees the same last line, so each one can compute
+    the same election from it without exchanging messages. The line seeds
+    both the idle threshold and a ranking of the channel's bots. The winner
+    revives once the threshold passes. Its line only reaches the channel when
+    its generation finishes, so each runner-up waits generation_seconds (the
+    longest a revival can take) plus backup_seconds longer per rank, in case
+    the winner is gone. The winner's message counts as activity and resets
+    everyone, so a quiet channel costs one generation instead of one per bot.
+
+    schedule(delay, func) must run func on the reactor thread after delay
+    seconds. candidates() returns the bot nicks currently in the channel.
+    revive() starts a revival. If it finds nothing to say, the runners-up
+    still get their turn after their backup delay.
+
+    Four bots whose generations take 90s, longer than backup_seconds, still
+    spend one generation per quiet period:
+
+    >>> now, timers, lines = [0.0], [], []
+    >>> bots = ["BotA", "BotB", "BotC", "BotD"]
+    >>> generations, overlapping = [], []
+    >>> def revive(nick):
+    ...     generations.append(nick)
+    ...     if lines:
+    ...         overlapping.append(nick)
+    ...     lines.append((now[0] + 90, f"{nick}: hello again"))
+    >>> schedulers = [
+    ...     RevivalScheduler(
+    ...         nick,
+    ...         schedule=lambda delay, func: timers.append((now[0] + delay, func)),
+    ...         candidates=lambda: bots,
+    ...         revive=lambda nick=nick: revive(nick),
+    ...         generation_seconds=350,
+    ...         clock=lambda: now[0]
+    ...     )
+    ...     for nick in bots
+    ... ]
+    >>> for scheduler in schedulers:
+    ...     scheduler.start()
+    >>> while now[0] < 3600:
+    ...     timers.sort(key=lambda timer: timer[0])
+    ...     lines.sort()
+    ...     if lines and lines[0][0] <= timers[0][0]:
+    ...         now[0], line = lines.pop(0)
+    ...         for scheduler in schedulers:
+    ...             scheduler.note_activity(line)
+    ...     else:
+    ...         now[0], fire = timers.pop(0)
+    ...         fire()
+    >>> len(generations) > 5, overlapping
+    (True, [])
+    """
+
+    def __init__(self, own_nick, schedule, candidates, revive,
+                 idle_seconds=180, jitter_seconds=120, backup_seconds=60,
+                 generation_seconds=0, clock=time.monotonic):
+        self.own_nick = own_nick
+        self.schedule = schedule
+        self.candidates = candidates
+        self.revive = revive
+        self.idle_seconds = idle_seconds
+        self.jitter_seconds = jitter_seconds
+        self.backup_seconds = backup_seconds
+        self.generation_seconds = generation_seconds
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._last_activity = self.clock()
+        self._seed = ""
+        self._attempted_seed = None
+        self._running = False
+        self._epoch = 0
+
+    def note_activity(self, line):
+        """Record a line said in the channel (by anyone, including us). Safe from any thread."""
+        with self._lock:
+            self._last_activity = self.clock()
+            self._seed = line
+
+    def start(self):
+        """Arm the timer. Call from the reactor thread, e.g. on connect."""
+        with self._lock:
+            self._running = True
+            self._epoch += 1
+            epoch = self._epoch
+            self._last_activity = self.clock()
+        self._arm(epoch, self._delay_for(self._seed))
+
+    def stop(self):
+        """Disarm the timer; an entry already on the scheduler becomes a no-op"""
+        with self._lock:
+            self._running = False
+            self._epoch += 1
+
+    def rank(self, seed):
+        """Our position in this quiet period's election (0 is the reviver)"""
+        own = self.own_nick.lower()
+        bots = {nick.lower() for nick in self.candidates()} | {own}
+        order = sorted(bots, key=lambda nick: _seeded_fraction(seed, nick))
+        return order.index(own)
+
+    def _delay_for(self, seed):
+        threshold = self.idle_seconds + self.jitter_seconds * _seeded_fraction(seed)
+        return threshold + self.rank(seed) * (self.generation_seconds + self.backup_seconds)
+
+    def _arm(self, epoch, delay):
+        # Activity can move the deadline earlier (a new line may elect us), but
+        # never to less than idle_seconds away, so never sleep longer than that.
+        delay = min(max(delay, 1), self.idle_seconds)
+        self.schedule(delay, lambda: self._fire(epoch))
+
+    def _fire(self, epoch):
+        with self._lock:
+            if not self._running or epoch != self._epoch:
+                return
+            seed = self._seed
+            idle = self.clock() - self._last_activity
+            attempted = self._attempted_seed == seed
+
+        delay = self._delay_for(seed)
+        if idle < delay:
+            # There was activity since we armed; sleep until the new deadline
+            self._arm(epoch, delay - idle)
+            return
+
+        if not attempted:
+            with self._lock:
+                self._attempted_seed = seed
+            try:
+                self.revive()
+            except Exception as e:
+                print(f"[{self.own_nick}] Error reviving conversation: {e}")
+
+        # Either we just revived (our own line will reset the clock) or we already
+        # tried this quiet period; look again after another idle stretch.
+        self._arm(epoch, self.idle_seconds)
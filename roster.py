@@ -0,0 +1,99 @@
+import re
+import threading
+
+# Characters allowed in IRC nicks besides letters and digits (RFC 2812 "special")
+NICK_CHARS = r"\w\[\]\\`^{|}-"
+
+# Prefixes NAMES puts in front of nicks to mark channel modes (op, voice, ...)
+NAMES_PREFIXES = "~&@%+"
+
+
+class Roster:
+    """Channel membership, compiled into one regex that finds every nick mentioned in a message.
+
+    The regex is rebuilt only when membership changes, so classifying a message
+    is a single scan however many bots are in the channel. Matches respect nick
+    boundaries, so "BotA" does not match inside "BotAB" or "robota".
+    """
+
+    def __init__(self, own_nick, bot_pattern=r"^Bot\w+$", always_known=()):
+        self.own_nick = own_nick
+        self.bot_pattern = re.compile(bot_pattern)
+        self.always_known = [nick for nick in always_known if nick]
+        self._lock = threading.Lock()
+        self._members = {}
+        self._matcher = None
+        self._known = {}
+        self._compile()
+
+    def _compile(self):
+        """Rebuild the mention matcher. Caller holds the lock (or is __init__)."""
+        nicks = {nick.lower(): nick for nick in self.always_known + [self.own_nick]}
+        nicks.update(self._members)
+        # Longest first so a nick that is a prefix of another never shadows it
+        alternatives = sorted((re.escape(nick) for nick in nicks), key=len, reverse=True)
+        matcher = re.compile(
+            rf"(?<![{NICK_CHARS}])(?:{'|'.join(alternatives)})(?![{NICK_CHARS}])",
+            re.IGNORECASE
+        )
+        # Swapped together so mentions() never pairs a matcher with the wrong spellings
+        self._matcher, self._known = matcher, nicks
+
+    def reset(self, nicks=()):
+        """Replace the member list, e.g. after (re)joining the channel"""
+        with self._lock:
+            self._members = {}
+            for nick in nicks:
+                nick = nick.lstrip(NAMES_PREFIXES)
+                if nick:
+                    self._members[nick.lower()] = nick
+            self._compile()
+
+    def add(self, *nicks):
+        with self._lock:
+            changed = False
+            for nick in nicks:
+                nick = nick.lstrip(NAMES_PREFIXES)
+                if nick and self._members.get(nick.lower()) != nick:
+                    self._members[nick.lower()] = nick
+                    changed = True
+            if changed:
+                self._compile()
+
+    def remove(self, nick):
+        with self._lock:
+            if self._members.pop(nick.lower(), None) is not None:
+                self._compile()
+
+    def rename(self, old_nick, new_nick):
+        with self._lock:
+            self._members.pop(old_nick.lower(), None)
+            self._members[new_nick.lower()] = new_nick
+            self._compile()
+
+    @property
+    def members(self):
+        with self._lock:
+            return list(self._members.values())
+
+    def is_bot(self, nick):
+        return bool(self.bot_pattern.match(nick))
+
+    def mentions(self, text):
+        """Nicks mentioned in text, spelled as they appear in the roster
+
+        >>> roster = Roster("BotA")
+        >>> roster.add("BotB", "Victoria")
+        >>> sorted(roster.mentions("hey botb, ask VICTORIA"))
+        ['BotB', 'Victoria']
+        >>> any(roster.is_bot(nick) for nick in roster.mentions("hey botb"))
+        True
+        """
+        matcher, known = self._matcher, self._known
+        return {known[match.group(0).lower()] for match in matcher.finditer(text)}
+
+
+def history_speaker(line):
+    """Nick at the start of a "nick: message" history line, or None"""
+    nick, sep, _ = line.partition(": ")
+    return nick if sep else None
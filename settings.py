@@ -0,0 +1,150 @@
+import json
+import os
+import re
+from dataclasses import dataclass
+from types import MappingProxyType
+
+from ollama_pool import parse_ollama_urls
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Immutable snapshot of the bot's configuration.
+
+    A reload builds a whole new Settings and swaps it in with a single
+    assignment, so code that grabs the current snapshot once sees one
+    consistent config for as long as it holds on to it. load_settings
+    validates everything up front, so a Settings can always be applied.
+    """
+
+    server: str
+    port: int
+    channel: str
+
+    bot_name: str
+    personality: str
+    model: str
+    always_respond_to: str
+    bot_nick_pattern: re.Pattern
+
+    ollama_urls: tuple
+    health_check_interval: float
+    num_ctx: int
+    num_predict: int
+    exact_token_count: bool
+
+    enable_logging: bool
+    log_dir: str
+    prompt_file: str
+
+    off_topic_chance: float
+    tone_chance: float
+    post_delay_seconds: float
+    post_delay_jitter: float
+    max_concurrent_requests: int
+    conversation_history_length: int
+    response_probabilities: MappingProxyType
+    revival_idle_seconds: float
+    revival_jitter_seconds: float
+    revival_backup_seconds: float
+
+    memory_enabled: bool
+    memory_max_lines: int
+    memory_max_chars: int
+
+    profile_duration_seconds: float
+    profile_sample_interval_ms: float
+
+
+def load_settings(path, args):
+    """Read path, apply environment and command line overrides and return a Settings"""
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    # Override with environment variables if they exist
+    config["irc"]["server"] = os.getenv("IRC_SERVER", config["irc"]["server"])
+    config["irc"]["port"] = int(os.getenv("IRC_PORT", config["irc"]["port"]))
+    config["irc"]["channel"] = os.getenv("IRC_CHANNEL", config["irc"]["channel"])
+
+    config["bot"]["name"] = os.getenv("BOT_NAME", config["bot"]["name"])
+    config["bot"]["personality"] = os.getenv("BOT_PERSONALITY", config["bot"]["personality"])
+    config["bot"]["model"] = os.getenv("BOT_MODEL", config["bot"]["model"])
+    config["bot"]["always_respond_to"] = os.getenv("BOT_ALWAYS_RESPOND_TO", config["bot"]["always_respond_to"])
+
+    config["ollama"]["url"] = os.getenv("OLLAMA_URL", config["ollama"]["url"])
+
+    # Override with command line arguments if they exist
+    if args.bot_name:
+        config["bot"]["name"] = args.bot_name
+    if args.personality:
+        config["bot"]["personality"] = args.personality
+    if args.model:
+        config["bot"]["model"] = args.model
+    if args.irc_server:
+        config["irc"]["server"] = args.irc_server
+    if args.irc_port:
+        config["irc"]["port"] = args.irc_port
+    if args.irc_channel:
+        config["irc"]["channel"] = args.irc_channel
+    if args.ollama_url:
+        config["ollama"]["url"] = args.ollama_url
+
+    # The config file holds a list of channels, overrides a single name; we join the first
+    channel = config["irc"]["channel"]
+    if not isinstance(channel, str):
+        channel = channel[0]
+
+    # Validate anything that could otherwise fail halfway through applying the config
+    try:
+        bot_nick_pattern = re.compile(config["bot"].get("bot_nick_pattern", r"^Bot\w+$"))
+    except re.error as e:
+        raise ValueError(f"Invalid bot.bot_nick_pattern: {e}") from e
+    ollama_urls = tuple(parse_ollama_urls(config["ollama"]["url"]))
+    if not ollama_urls:
+        raise ValueError("ollama.url must name at least one Ollama endpoint")
+    max_concurrent_requests = int(config["behavior"]["max_concurrent_requests"])
+    if max_concurrent_requests < 1:
+        raise ValueError("behavior.max_concurrent_requests must be at least 1")
+
+    memory = config.get("memory", {})
+    profiling = config.get("profiling", {})
+
+    return Settings(
+        server=config["irc"]["server"],
+        port=config["irc"]["port"],
+        channel=channel,
+
+        bot_name=config["bot"]["name"],
+        personality=config["bot"]["personality"],
+        model=config["bot"]["model"],
+        always_respond_to=config["bot"]["always_respond_to"],
+        bot_nick_pattern=bot_nick_pattern,
+
+        ollama_urls=ollama_urls,
+        health_check_interval=config["ollama"].get("health_check_interval", 10),
+        num_ctx=config["ollama"].get("num_ctx", 2048),
+        num_predict=config["ollama"].get("max_tokens", 120),
+        exact_token_count=config["ollama"].get("exact_token_count", False),
+
+        enable_logging=config["logging"]["enabled"],
+        log_dir=config["logging"]["log_dir"],
+        prompt_file=config["files"]["prompt_file"],
+
+        off_topic_chance=config["behavior"]["off_topic_chance"],
+        tone_chance=config["behavior"]["tone_chance"],
+        post_delay_seconds=config["behavior"]["post_delay_seconds"],
+        post_delay_jitter=config["behavior"]["post_delay_jitter"],
+        max_concurrent_requests=max_concurrent_requests,
+        conversation_history_length=config["behavior"]["conversation_history_length"],
+        response_probabilities=MappingProxyType(dict(config["behavior"]["response_probabilities"])),
+        revival_idle_seconds=config["behavior"].get("revival_idle_seconds", 180),
+        revival_jitter_seconds=config["behavior"].get("revival_jitter_seconds", 120),
+        revival_backup_seconds=config["behavior"].get("revival_backup_seconds", 60),
+
+        memory_enabled=memory.get("enabled", True),
+        memory_max_lines=memory.get("max_lines", 3),
+        memory_max_chars=memory.get("max_chars", 500),
+
+        profile_duration_seconds=profiling.get("duration_seconds", 30),
+        profile_sample_interval_ms=profiling.get("sample_interval_ms", 10),
+    )